@@ -8,16 +8,17 @@ Fecha: 08 de noviembre de 2024
 """
 
 from mesa import Agent, Model
-from mesa.time import SimultaneousActivation
 from mesa.space import MultiGrid
-from mesa.datacollection import DataCollector
 from mesa.visualization.modules import CanvasGrid
 from mesa.visualization.ModularVisualization import ModularServer
 import random
+from collections import Counter
+import numpy as np
 
 class CeldaAgent(Agent):
     """
-    Agente que representa una celda en la habitación, que puede estar limpia o sucia.
+    Agente que representa una celda en la habitación, usado solo para su visualización.
+    El estado de la celda se guarda en la matriz `dirty` del modelo.
     
     Atributos:
         unique_id (int): Identificador único del agente.
@@ -26,11 +27,11 @@ class CeldaAgent(Agent):
     """
     def __init__(self, unique_id, model):
         super().__init__(unique_id, model)
-        self.sucia = False  # Inicializa la celda como limpia
 
-    def limpiar(self):
-        """Cambia el estado de la celda a limpia."""
-        self.sucia = False
+    @property
+    def sucia(self):
+        """Lee el estado de la celda desde la matriz del modelo."""
+        return bool(self.model.dirty[self.pos])
 
 
 class LimpiadorAgent(Agent):
@@ -45,19 +46,22 @@ class LimpiadorAgent(Agent):
     def __init__(self, unique_id, model):
         super().__init__(unique_id, model)
         self.movimientos = 0  # Contador inicializado en cero
+        self._randrange = model.random.randrange  # Evita resolver self.random en cada movimiento
 
     def step(self):
         """
         Realiza un paso de simulación para el agente limpiador.
         Si la celda está sucia, la limpia. Si no, se mueve a una nueva posición.
         """
-        celda = self.model.grid.get_cell_list_contents([self.pos])
-        
-        # Si la celda contiene una instancia de CeldaAgent sucia, procede a limpiarla
-        if any(isinstance(obj, CeldaAgent) and obj.sucia for obj in celda):
-            for obj in celda:
-                if isinstance(obj, CeldaAgent) and obj.sucia:
-                    obj.limpiar()
+        model = self.model
+        pos = self.pos
+        dirty = model.dirty
+
+        # Si la celda está sucia, procede a limpiarla
+        if dirty[pos]:
+            dirty[pos] = False
+            model.clean_count += 1
+            model.changed_this_step = True
         else:
             # Si la celda está limpia, el agente intenta moverse
             self.mover()
@@ -67,19 +71,21 @@ class LimpiadorAgent(Agent):
         Cambia la posición del agente limpiador a una celda adyacente sin otro limpiador.
         Incrementa el contador de movimientos en cada movimiento realizado.
         """
-        posibles_movimientos = self.model.grid.get_neighborhood(self.pos, moore=True, include_center=False)
-        
+        model = self.model
+        pos = self.pos
+        occupied = model.occupied
+
         # Filtra movimientos válidos donde no haya otro agente limpiador
-        valid_moves = [
-            pos for pos in posibles_movimientos
-            if not any(isinstance(a, LimpiadorAgent) for a in self.model.grid.get_cell_list_contents([pos]))
-        ]
+        valid_moves = [p for p in model.neighbors_of[pos] if occupied[p] == 0]
 
         # Realiza un movimiento a una posición aleatoria dentro de las válidas
         if valid_moves:
-            nueva_posicion = self.random.choice(valid_moves)
-            self.model.grid.move_agent(self, nueva_posicion)
+            nueva_posicion = valid_moves[self._randrange(len(valid_moves))]
+            occupied[pos] -= 1
+            occupied[nueva_posicion] += 1
+            model.grid.move_agent(self, nueva_posicion)
             self.movimientos += 1  # Incrementa el contador de movimientos
+            model.total_movimientos += 1
 
 
 class HabitacionModel(Model):
@@ -91,48 +97,67 @@ class HabitacionModel(Model):
         N (int): Cantidad de columnas en la habitación.
         num_agentes (int): Número de agentes limpiadores en el modelo.
         celdas_sucias (int): Número inicial de celdas sucias en la habitación.
-        schedule (SimultaneousActivation): Controlador de activación de agentes.
+        steps (int): Número de pasos ejecutados.
         grid (MultiGrid): Espacio de la habitación donde se colocan los agentes.
         running (bool): Controla si la simulación está activa.
+        verbose (bool): Si es True, imprime el porcentaje de celdas limpias en cada paso.
+        clean_count (int): Número de celdas inicialmente sucias que ya fueron limpiadas.
+        changed_this_step (bool): Indica si se limpió alguna celda en el último paso.
+        neighbors_of (dict): Vecindad de Moore precalculada para cada posición de la cuadrícula.
+        occupied (Counter): Número de agentes limpiadores en cada posición.
+        dirty (ndarray): Matriz booleana de M x N, True en las celdas sucias.
+        cleaners (list): Agentes limpiadores del modelo, activados en este orden en cada paso.
+        total_movimientos (int): Suma de los movimientos de todos los agentes limpiadores.
+        clean_pct_hist (list): Porcentaje de celdas limpias registrado en cada paso.
+        moves_hist (list): Movimientos totales registrados en cada paso.
     """
-    def __init__(self, M, N, num_agentes, celdas_sucias):
+    def __init__(self, M, N, num_agentes, celdas_sucias, verbose=False):
         self.M = M
         self.N = N
         self.num_agentes = num_agentes
         self.celdas_sucias = celdas_sucias
-        self.schedule = SimultaneousActivation(self)
+        self.steps = 0
         self.grid = MultiGrid(M, N, torus=False)
         self.running = True
+        self.verbose = verbose
+        self.clean_count = 0
+        self.changed_this_step = False
+
+        # Precalcula la vecindad de cada celda, que no cambia durante la simulación
+        self.neighbors_of = {
+            (i, j): tuple(self.grid.get_neighborhood((i, j), moore=True, include_center=False))
+            for i in range(M) for j in range(N)
+        }
 
         # Inicializa celdas con algunas sucias al azar
         unique_id = 0
         total_celdas = M * N
         posiciones_sucias = self.random.sample(range(total_celdas), celdas_sucias)
-        self.dirty_positions = set()
-
-        for i in range(M):
-            for j in range(N):
-                celda = CeldaAgent(unique_id, self)
-                if unique_id in posiciones_sucias:
-                    celda.sucia = True
-                    self.dirty_positions.add((i, j))
-                self.grid.place_agent(celda, (i, j))
-                unique_id += 1
+        self.dirty = np.zeros((M, N), dtype=bool)
+        self.dirty.flat[posiciones_sucias] = True
+
+        # Solo las celdas sucias se colocan en la cuadrícula, para que CanvasGrid las dibuje;
+        # las limpias se ven con el fondo blanco del lienzo
+        for idx in posiciones_sucias:
+            celda = CeldaAgent(unique_id, self)
+            self.grid.place_agent(celda, divmod(idx, N))
+            unique_id += 1
 
         # Agrega los agentes limpiadores en la habitación
+        # Todos inician en (1, 1), por lo que la ocupación se lleva como multiconjunto
+        self.occupied = Counter()
+        self.cleaners = []
+        self.total_movimientos = 0
         for i in range(num_agentes):
             limpiador = LimpiadorAgent(i, self)
             self.grid.place_agent(limpiador, (1, 1))
-            self.schedule.add(limpiador)
+            self.occupied[(1, 1)] += 1
+            self.cleaners.append(limpiador)
             unique_id += 1
 
-        # Configura el recolector de datos
-        self.datacollector = DataCollector(
-            model_reporters={
-                "Celdas Limpias": self.contar_celdas_limpias,
-                "Movimientos Totales": self.contar_movimientos
-            }
-        )
+        # Historial de datos por paso
+        self.clean_pct_hist = []
+        self.moves_hist = []
 
     def contar_celdas_limpias(self):
         """
@@ -141,13 +166,7 @@ class HabitacionModel(Model):
         Retorna:
             float: Porcentaje de celdas limpias respecto a las celdas iniciales sucias.
         """
-        celdas_limpias = sum(
-            1 for pos in self.dirty_positions
-            for content in self.grid.get_cell_list_contents([pos])
-            if isinstance(content, CeldaAgent) and not content.sucia
-        )
-        porcentaje = (celdas_limpias / self.celdas_sucias) * 100
-        return porcentaje
+        return 100.0 * self.clean_count / self.celdas_sucias
 
     def contar_movimientos(self):
         """
@@ -156,21 +175,27 @@ class HabitacionModel(Model):
         Retorna:
             int: Suma de los movimientos de todos los agentes limpiadores.
         """
-        return sum(agente.movimientos for agente in self.schedule.agents if isinstance(agente, LimpiadorAgent))
+        return self.total_movimientos
 
     def step(self):
         """
         Realiza un paso de simulación, recolecta datos y evalúa si todas las celdas están limpias.
         Si todas las celdas sucias están limpias, detiene la simulación.
         """
-        self.datacollector.collect(self)
         porcentaje_limpias = self.contar_celdas_limpias()
-        print(f"Paso {self.schedule.steps}: {porcentaje_limpias:.2f}% de celdas limpias")
-        
-        if porcentaje_limpias >= 100:
+        self.clean_pct_hist.append(porcentaje_limpias)
+        self.moves_hist.append(self.total_movimientos)
+        if self.verbose:
+            print(f"Paso {self.steps}: {porcentaje_limpias:.2f}% de celdas limpias")
+
+        # Solo puede terminar si en el paso anterior se limpió alguna celda
+        if self.changed_this_step and self.clean_count == self.celdas_sucias:
             self.running = False
-        else:
-            self.schedule.step()
+            return
+        self.changed_this_step = False
+        for limpiador in self.cleaners:
+            limpiador.step()
+        self.steps += 1
 
 
 def agent_portrayal(agent):